@@ -1,8 +1,10 @@
 
 
 import re
+import unicodedata
 from mycroft.skills.core import intent_handler, intent_file_handler
 from mycroft.util.parse import match_one, fuzzy_match
+from mycroft.util.format import pronounce_number
 from mycroft.messagebus import Message
 from requests import HTTPError
 from adapt.intent import IntentBuilder
@@ -12,10 +14,11 @@ from os.path import abspath, dirname, join
 from subprocess import call, Popen, DEVNULL
 import signal
 from socket import gethostname
+from threading import Thread, Event, Lock
 from mycroft.skills.common_play_skill import CommonPlaySkill, CPSMatchLevel
 from mycroft.skills.audioservice import AudioService
 from mpd import MPDClient
-from mpd.base import ConnectionError
+from mpd.base import ConnectionError, MPDError
 
 class PlaybackError(Exception):
     pass
@@ -38,6 +41,15 @@ DIRECT_RESPONSE_CONFIDENCE = 0.9
 
 MATCH_CONFIDENCE = 0.5
 
+# Readiness states of the background catalog warm-up
+WARMUP_CONNECTING = 'connecting'
+WARMUP_PARTIAL = 'partially indexed'
+WARMUP_READY = 'ready'
+# Seconds between connection attempts while MPD is unreachable
+WARMUP_RETRY_INTERVAL = 5
+# python-mpd2 raises ConnectionError with this text if already connected
+ALREADY_CONNECTED = 'Already connected'
+
 
 def best_confidence(title, query):
     """Find best match for a title against a query.
@@ -55,6 +67,60 @@ def best_confidence(title, query):
     return max(fuzzy_match(best, query),
                fuzzy_match(best_stripped, query))
 
+
+# "feat. X" credits, either in brackets or trailing the name
+FEATURING_REGEX = re.compile(
+    r'[(\[]\s*(feat\.?|ft\.?|featuring)\s[^)\]]*[)\]]'
+    r'|\s(feat\.?|ft\.?|featuring)\s.*$', re.IGNORECASE)
+# Version info such as "(Remastered 2016)" or " - Live"
+SUFFIX_REGEX = re.compile(r'(\(.+\)|\[.+\]|\s-\s.+)$')
+
+
+def normalize_name(name):
+    """Normalize a catalog entry or query for exact lookup.
+    Drops diacritics, featuring credits and punctuation, spells out "&"
+    and numerals, so "Beyoncé & Jay-Z" and "beyonce and jay z" agree.
+    Arguments:
+        name (str): catalog name or query
+    Returns:
+        (str) normalized form
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = FEATURING_REGEX.sub('', name).lower().replace('&', ' and ')
+    words = []
+    for word in re.sub(r'[^\w\s]', ' ', name).split():
+        if word.isdecimal():
+            word = re.sub(r'[^\w\s]', ' ', pronounce_number(int(word)))
+        words.extend(word.split())
+    return ' '.join(words)
+
+
+def alias_forms(name):
+    """All normalized forms a catalog name can be asked for by,
+    with and without version suffix and leading "the".
+    """
+    forms = {normalize_name(name),
+             normalize_name(SUFFIX_REGEX.sub('', name).strip())}
+    forms.update([f[len('the '):] for f in forms if f.startswith('the ')])
+    forms.discard('')
+    return forms
+
+
+def build_alias_index(names):
+    """Map every alias form to its catalog name.
+    Each entry's own normalized name is indexed before any derived form,
+    so "Hello" is not shadowed by the stripped alias of "Hello (Live)".
+    Otherwise the first name wins.
+    """
+    index = {}
+    for name in names:
+        index.setdefault(normalize_name(name), name)
+    for name in names:
+        for form in alias_forms(name):
+            index.setdefault(form, name)
+    return index
+
 class MpcPlayer(CommonPlaySkill):
     """
         MPD control through MPD client, using only the common play framework Query
@@ -75,8 +141,16 @@ class MpcPlayer(CommonPlaySkill):
         self.albums = []
         self.songs  = []
         self.playlists = []
+        #exact lookup tables, alias form -> catalog name per type
+        self.alias_index = {}
         self.last_played_type = None
         self.spoken_name="MPD Player"
+        self.mpd_host = 'localhost'
+        self.mpd_port = 6600
+        self.catalog_state = WARMUP_CONNECTING
+        self.warm_up_stop = Event()
+        self.warm_up_thread = None
+        self.connect_lock = Lock()
 
     def initialize(self):
         #add handler for non existing MPD server
@@ -90,20 +164,78 @@ class MpcPlayer(CommonPlaySkill):
         self.add_event('mycroft.audio.service.pause', self.pause)
         self.add_event('mycroft.audio.service.resume', self.resume)
         self.create_intents()
+        #catalog is loaded in the background, playback controls are
+        #usable right away
+        self.warm_up_thread = Thread(target=self.warm_up, daemon=True)
+        self.warm_up_thread.start()
+        self.schedule_repeating_event(self.keep_alive, None, 10, name="MPD Keep Alive")
         self.log.info("MPD player skill initialized")
-        #should handle not connecting, but for now ok
+
+    def warm_up(self):
+        """Connect to MPD and build the catalog in the background.
+
+        Playlists and artists are cheap to list and are published first
+        (WARMUP_PARTIAL), albums and titles follow (WARMUP_READY).
+        A separate client is used so the listing does not interleave
+        with commands sent on the shared client by other handlers.
+        Connecting and indexing are retried until they succeed or the
+        skill shuts down, then the shared client is connected for the
+        queries that follow. Entry points still connect on demand
+        through MPDconnect, which is serialized.
+        """
+        self.catalog_state = WARMUP_CONNECTING
+        while not self.warm_up_stop.is_set():
+            catalog_client = MPDClient()
+            try:
+                catalog_client.connect(host=self.mpd_host,
+                                       port=self.mpd_port)
+                self.index_catalog(catalog_client)
+                break
+            except (MPDError, OSError) as e:
+                self.log.warning("MPD catalog warm-up failed, retrying: "
+                                 + str(e))
+            finally:
+                try:
+                    catalog_client.disconnect()
+                except (MPDError, OSError):
+                    pass
+            self.warm_up_stop.wait(WARMUP_RETRY_INTERVAL)
+        else:
+            return
         self.MPDconnect()
-        self.artist =  [a['artist'].lower() for a in self.client.list('artist')]
-        self.albums =  [a['album'].lower() for a in self.client.list('album')]
+
+    def index_catalog(self, catalog_client):
+        """List the catalog through catalog_client and publish it."""
+        self.playlists = [p['playlist']
+                          for p in catalog_client.listplaylists()]
+        self.artist = [a['artist'].lower()
+                       for a in catalog_client.list('artist')]
+        self.alias_index['playlist'] = build_alias_index(self.playlists)
+        self.alias_index['artist'] = build_alias_index(self.artist)
+        self.catalog_state = WARMUP_PARTIAL
+        self.log.info("MPD catalog: playlists and artists indexed")
+        self.albums = [a['album'].lower()
+                       for a in catalog_client.list('album')]
         #have to check for best matching version
         #maybe use metaphone
-        self.songs  =  [t['title'] for t in self.client.list('title')]
-        self.playlists = [p['playlist'] for p in self.client.listplaylists()]
-        self.schedule_repeating_event(self.keep_alive, None, 10, name="MPD Keep Alive")
+        self.songs = [t['title'] for t in catalog_client.list('title')]
+        self.alias_index['album'] = build_alias_index(self.albums)
+        self.alias_index['track'] = build_alias_index(self.songs)
+        self.catalog_state = WARMUP_READY
+        self.log.info("MPD catalog ready")
+
+    def shutdown(self):
+        self.warm_up_stop.set()
+        super().shutdown()
 
     def keep_alive(self):
-        self.MPDconnect()
-        self.client.status()
+        if not self.MPDconnect():
+            return
+        try:
+            self.client.status()
+        except (ConnectionError, OSError):
+            self.log.warning("MPD connection lost, reconnecting")
+            self.client.disconnect()
     ######################################################################
     # Handle auto ducking when listener is started.
 
@@ -112,8 +244,14 @@ class MpcPlayer(CommonPlaySkill):
         The ducking is enabled/disabled using the skill settings on home.
         TODO: Evaluate the Idle check logic
         """
-        if (self.client.status()['state'] == 'play' and
-                self.settings.get('use_ducking', True)):
+        if not self.MPDconnect():
+            return
+        try:
+            state = self.client.status()['state']
+        except (ConnectionError, OSError):
+            self.log.error("MPC Protocol Error")
+            return
+        if state == 'play' and self.settings.get('use_ducking', True):
             self.pause()
             self.ducking = True
 
@@ -124,7 +262,14 @@ class MpcPlayer(CommonPlaySkill):
             #                  1, name='IdleCheck')
 
     def handle_listener_ended(self, message):
-        if (self.client.status()['state'] == 'pause' and
+        if not self.MPDconnect():
+            return
+        try:
+            state = self.client.status()['state']
+        except (ConnectionError, OSError):
+            self.log.error("MPC Protocol Error")
+            return
+        if (state == 'pause' and
                 self.settings.get('use_ducking', True)): #by default always use ducking
             self.resume(message)
             self.ducking = True
@@ -181,6 +326,21 @@ class MpcPlayer(CommonPlaySkill):
             album = ''
         self.CPS_send_status(artist=artist, track=track, image=image, album=album)
 
+    def exact_match(self, data_type, phrase):
+        """
+        Look the phrase up in the alias index of data_type
+        :param data_type: 'playlist', 'artist', 'album' or 'track'
+        :param phrase: name asked for by the user
+        :return: catalog name or None
+        """
+        index = self.alias_index.get(data_type, {})
+        query = normalize_name(phrase)
+        if query in index:
+            return index[query]
+        if query.startswith('the '):
+            return index.get(query[len('the '):])
+        return None
+
     def translate_regex(self, regex):
         if regex not in self.regexes:
             path = self.find_resource(regex+'.regex')
@@ -207,7 +367,11 @@ class MpcPlayer(CommonPlaySkill):
         phrase = re.sub(self.translate_regex('on_mpd'), "", phrase, re.IGNORECASE)
         confidence, data = self.continue_playback(phrase, bonus)
         self.log.info("MPD check: " + phrase)
-        if not data:
+        #answer from whatever part of the catalog is already indexed,
+        #the queries look up details on the shared client
+        if not data and self.catalog_state != WARMUP_CONNECTING:
+            if not self.MPDconnect():
+                return
             self.log.info("MPD check for specific query")
             confidence, data = self.specific_query(phrase, bonus)
             if not data:
@@ -270,7 +434,7 @@ class MpcPlayer(CommonPlaySkill):
         if match:
             self.log.info("Checking specific playlist")
             conf, data = self.query_playlist(match.groupdict()['playlist'])
-            if conf > 0.7:
+            if conf and conf > 0.7:
                 return conf, data
             else:
                 return NOTHING_FOUND
@@ -336,15 +500,17 @@ class MpcPlayer(CommonPlaySkill):
                 #Check for Track
                 self.log.info('Checking tracks')
                 if len(self.songs) > 0:
-                    key, conf = match_one(phrase.lower(), self.songs)
+                    key, conf = self.exact_match('track', phrase), 1.0
+                    if not key:
+                        key, conf = match_one(phrase.lower(), self.songs)
                     #key = titles.index(key)
                     self.log.info("Matched with " + key + " at " + str(conf))
                     track_data = self.client.search('title', key)
                     data = {'data':track_data[0], 'name': key, 'type': 'track'}
-                if conf and conf > DIRECT_RESPONSE_CONFIDENCE:
-                    return conf, data
-                elif conf and conf > MATCH_CONFIDENCE:
-                    results.append((conf, data))
+                    if conf and conf > DIRECT_RESPONSE_CONFIDENCE:
+                        return conf, data
+                    elif conf and conf > MATCH_CONFIDENCE:
+                        results.append((conf, data))
 
                 #Check for album
                 self.log.info("Checking albums")
@@ -401,7 +567,7 @@ class MpcPlayer(CommonPlaySkill):
             song, artist = song.split(by_word)
             self.log.info("Using search by artist")
             confidence, data = self.query_artist(artist)
-            if confidence > 0.6:
+            if confidence and confidence > 0.6:
                 songs = self.client.search('artist', data['data'])
                 #songtitles = [t['title'].lower() for t in songs]
                 key, confidence = match_one(song, songs)
@@ -411,7 +577,9 @@ class MpcPlayer(CommonPlaySkill):
         else:
             song_search = song
         if self.songs and len(self.songs) > 0:
-            key, confidence = match_one(song, self.songs)
+            key, confidence = self.exact_match('track', song), 1.0
+            if not key:
+                key, confidence = match_one(song, self.songs)
             return confidence + bonus, {'data': self.client.search('title', key)[0], 'name': key, 'type': 'track'}
         else:
             return NOTHING_FOUND
@@ -426,7 +594,9 @@ class MpcPlayer(CommonPlaySkill):
         if len(self.playlists) > 0:
             #names of all playlists
             #have to watch out for lower case matching
-            key, confidence = match_one(phrase.lower(), self.playlists)
+            key, confidence = self.exact_match('playlist', phrase), 1.0
+            if not key:
+                key, confidence = match_one(phrase.lower(), self.playlists)
             self.log.info("MPD Playlist: " + phrase + " matched to " + key + " with conf" + str(confidence))
             #key = play.index(key)
             playlistdata = self.client.listplaylistinfo(key)
@@ -452,10 +622,11 @@ class MpcPlayer(CommonPlaySkill):
             album_search = album
         else:
             album_search = album
-        albums = self.client.list('album')
-        if len(albums) > 0:
+        if len(self.albums) > 0:
             #albumlist = [a['album'].lower() for a in albums]
-            key, confidence = match_one(album.lower(), self.albums)
+            key, confidence = self.exact_match('album', album), 1.0
+            if not key:
+                key, confidence = match_one(album.lower(), self.albums)
             #album returns album name as data
             self.log.info("MPD Album: " + album + " matched to " + key + " with conf " + str(confidence))
             #not the best tactic
@@ -474,12 +645,13 @@ class MpcPlayer(CommonPlaySkill):
         :return:
         """
         bonus += 0.1
-        artists = self.client.list('artist')
-        if len(artists) > 0:
+        if len(self.artist) > 0:
             #list of artists
             #lower ok because we use searchadd
             #artists = [a['artist'].lower() for a in artists]
-            key, confidence = match_one(artist.lower(), self.artist)
+            key, confidence = self.exact_match('artist', artist), 1.0
+            if not key:
+                key, confidence = match_one(artist.lower(), self.artist)
             confidence = min(confidence+bonus, 1.0)
             self.log.info("MPD Artist: " + artist + " matched to " + key + " with conf " + str(confidence))
             #artistdata = self.client.search('artist'.key)
@@ -593,10 +765,14 @@ class MpcPlayer(CommonPlaySkill):
 
     def __pause(self):
         # if authorized and playback was started by the skill
-        if self.client:
-            self.log.info('Pausing MPD')
+        if not self.MPDconnect():
+            return
+        self.log.info('Pausing MPD')
+        try:
             if self.client.status()['state'] != 'pause':
                 self.client.pause()
+        except (ConnectionError, OSError):
+            self.log.error("MPC Protocol Error")
 
     def pause(self, message=None):
         """ Handler for playback control pause. """
@@ -605,42 +781,59 @@ class MpcPlayer(CommonPlaySkill):
 
     def resume(self, message=None):
         """ Handler for playback control resume. """
-        if self.client:
-            self.log.info('Resume MPD')
+        if not self.MPDconnect():
+            return
+        self.log.info('Resume MPD')
+        try:
             self.client.play()
+        except (ConnectionError, OSError):
+            self.log.error("MPC Protocol Error")
 
     def next_track(self, message):
         """ Handler for playback control next. """
         # if authorized and playback was started by the skill
-        if self.client:
-            self.log.info('Next MPD track')
-            try:
-                self.client.next()
-            except Exception:
-                self.log.error("MPC Protocol Error")
-            self.start_monitor()
-            return True
-        return False
+        if not self.MPDconnect():
+            return False
+        self.log.info('Next MPD track')
+        try:
+            self.client.next()
+        except (ConnectionError, OSError):
+            self.log.error("MPC Protocol Error")
+        self.start_monitor()
+        return True
 
     def prev_track(self, message):
         """ Handler for playback control prev. """
         # if authorized and playback was started by the skill
-        if self.client:
-            self.log.info('Previous MPD track')
-            try:
-                self.client.prev()
-            except Exception:
-                self.log.error("MPC Protocol Error")
-            self.start_monitor()
+        if not self.MPDconnect():
+            return False
+        self.log.info('Previous MPD track')
+        try:
+            self.client.previous()
+        except (ConnectionError, OSError):
+            self.log.error("MPC Protocol Error")
+        self.start_monitor()
+        return True
 
     def MPDstatus(self):
         self.client.status()
-    def MPDconnect(self, host='localhost', port=6600):
-        try:
-            self.client.connect(host=host, port = port)
-        except ConnectionError:
-            self.log.error("Already connected")
-            pass
+    def MPDconnect(self, host=None, port=None):
+        """Connect the shared client, returns whether it is connected.
+        Serialized since handlers and timers run on different threads.
+        """
+        with self.connect_lock:
+            try:
+                self.client.connect(host=host or self.mpd_host,
+                                    port=port or self.mpd_port)
+            except ConnectionError as e:
+                if str(e) == ALREADY_CONNECTED:
+                    return True
+                self.log.error("Unable to connect to MPD: " + str(e))
+                return False
+            except OSError as e:
+                self.log.error("Unable to connect to MPD: " + str(e))
+                return False
+        return True
 
     def start_playlist_playback(self, name="", data=None):
         utterance = name.replace('|', ':')
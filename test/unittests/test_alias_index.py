@@ -0,0 +1,76 @@
+"""
+    Unit checks for the catalog alias helpers.
+    The skill module imports mycroft-core and python-mpd2, so these run
+    from the mycroft virtualenv and are skipped where those are missing.
+"""
+import importlib.util
+import sys
+import unittest
+from os.path import abspath, dirname, join
+
+for dependency in ('mycroft', 'mpd'):
+    if importlib.util.find_spec(dependency) is None:
+        raise unittest.SkipTest('{} is not installed'.format(dependency))
+
+sys.path.insert(0, join(dirname(dirname(dirname(abspath(__file__)))),
+                        'tools'))
+from skill_loader import load_skill  # noqa: E402
+
+skill = load_skill()
+
+
+class TestNormalizeName(unittest.TestCase):
+    def test_diacritics(self):
+        self.assertEqual(skill.normalize_name('Beyoncé'), 'beyonce')
+
+    def test_ampersand(self):
+        self.assertEqual(skill.normalize_name('Simon & Garfunkel'),
+                         skill.normalize_name('simon and garfunkel'))
+
+    def test_featuring(self):
+        for name in ['Crazy in Love (feat. Jay-Z)', 'Crazy in Love ft. Jay-Z',
+                     'Crazy in Love [Featuring Jay-Z]']:
+            self.assertEqual(skill.normalize_name(name), 'crazy in love')
+
+    def test_numerals(self):
+        self.assertEqual(skill.normalize_name('Iron Man 2'),
+                         skill.normalize_name('iron man two'))
+
+    def test_punctuation(self):
+        self.assertEqual(skill.normalize_name("Guns N' Roses"),
+                         'guns n roses')
+
+
+class TestAliasForms(unittest.TestCase):
+    def test_leading_the(self):
+        self.assertEqual(skill.alias_forms('The Beatles'),
+                         {'the beatles', 'beatles'})
+
+    def test_version_suffix(self):
+        forms = skill.alias_forms('Hello Nasty (Remastered 2009)')
+        self.assertIn('hello nasty', forms)
+
+    def test_dash_in_name_is_kept(self):
+        self.assertEqual(skill.alias_forms('Jay-Z'), {'jay z'})
+
+
+class TestBuildAliasIndex(unittest.TestCase):
+    def test_own_name_beats_stripped_suffix(self):
+        index = skill.build_alias_index(['Hello (Live)', 'Hello'])
+        self.assertEqual(index['hello'], 'Hello')
+        self.assertEqual(index['hello live'], 'Hello (Live)')
+
+    def test_own_name_beats_stripped_the(self):
+        index = skill.build_alias_index(['The Band', 'Band'])
+        self.assertEqual(index['band'], 'Band')
+        self.assertEqual(index['the band'], 'The Band')
+
+    def test_derived_forms(self):
+        index = skill.build_alias_index(['The Beatles', 'Iron Man 2'])
+        self.assertEqual(index['beatles'], 'The Beatles')
+        self.assertEqual(index[skill.normalize_name('iron man two')],
+                         'Iron Man 2')
+
+
+if __name__ == '__main__':
+    unittest.main()
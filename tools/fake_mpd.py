@@ -0,0 +1,383 @@
+"""
+    Stand-in MPD server for exercising the skill without a real MPD.
+    Speaks the subset of the MPD protocol the skill uses over TCP and can
+    inject response latency, dropped connections and server restarts.
+"""
+import random
+import shlex
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter
+
+PROTOCOL_VERSION = '0.22.0'
+
+# ACK error codes used by MPD
+ACK_ERROR_ARG = 2
+ACK_ERROR_UNKNOWN = 5
+ACK_ERROR_NO_EXIST = 50
+
+
+class Catalog:
+    """Synthetic music library generated from a seed."""
+
+    def __init__(self, seed=0, artists=40, albums_per_artist=3,
+                 tracks_per_album=10, playlists=10):
+        rng = random.Random(seed)
+        self.songs = []
+        for a in range(artists):
+            artist = 'Artist {}'.format(a)
+            for b in range(albums_per_artist):
+                album = 'Album {} {}'.format(a, b)
+                for t in range(tracks_per_album):
+                    title = 'Song {} {} {}'.format(a, b, t)
+                    self.songs.append({
+                        'file': '{}/{}/{:02d}.flac'.format(artist, album, t),
+                        'Artist': artist,
+                        'Album': album,
+                        'Title': title,
+                        'Time': str(rng.randint(90, 420)),
+                    })
+        self.playlists = {}
+        for p in range(playlists):
+            size = rng.randint(5, 30)
+            self.playlists['Playlist {}'.format(p)] = rng.sample(self.songs,
+                                                                 size)
+
+    def tag_values(self, tag):
+        key = tag.capitalize()
+        return sorted({s[key] for s in self.songs if key in s})
+
+    def search(self, tag, value):
+        key = tag.capitalize()
+        value = value.lower()
+        return [s for s in self.songs if value in s.get(key, '').lower()]
+
+
+class PlayerState:
+    """Queue and playback state, shared by all connections."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = []
+        self.position = 0
+        self.state = 'stop'
+        self.version = 1
+
+    def current(self):
+        if self.state == 'stop' or not self.queue:
+            return None
+        return self.queue[self.position % len(self.queue)]
+
+
+class CommandError(Exception):
+    def __init__(self, code, command, text):
+        super().__init__(text)
+        self.code = code
+        self.command = command
+        self.text = text
+
+    def ack(self):
+        return 'ACK [{}@0] {{{}}} {}\n'.format(self.code, self.command,
+                                               self.text)
+
+
+class MPDRequestHandler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        super().setup()
+        self.server.owner.register(self.request)
+
+    def finish(self):
+        self.server.owner.unregister(self.request)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def handle(self):
+        owner = self.server.owner
+        self.send('OK MPD {}\n'.format(PROTOCOL_VERSION))
+        command_list = None
+        list_ok = False
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:
+                return
+            if not line:
+                return
+            line = line.decode('utf-8', 'replace').rstrip('\n')
+            owner.count('commands')
+            if line in ('command_list_begin', 'command_list_ok_begin'):
+                command_list = []
+                list_ok = line == 'command_list_ok_begin'
+                continue
+            if command_list is not None and line != 'command_list_end':
+                command_list.append(line)
+                continue
+            if line == 'close':
+                return
+            if command_list is None:
+                lines, list_ok = [line], False
+            else:
+                lines, command_list = command_list, None
+            response = []
+            for command in lines:
+                try:
+                    response.append(owner.execute(command))
+                except CommandError as e:
+                    response.append(e.ack())
+                    break
+                if list_ok:
+                    response.append('list_OK\n')
+            else:
+                response.append('OK\n')
+            if not self.reply(''.join(response)):
+                return
+
+    def reply(self, data):
+        """Send a response, applying the configured faults.
+        Returns False when the connection was dropped.
+        """
+        faults = self.server.owner.faults
+        if faults.latency:
+            time.sleep(faults.rng.uniform(0, faults.latency))
+        if faults.rng.random() < faults.drop_rate:
+            self.server.owner.count('dropped')
+            # Cut the response short to mimic a connection lost mid-reply
+            self.send(data[:len(data) // 2])
+            try:
+                self.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return False
+        return self.send(data)
+
+    def send(self, data):
+        try:
+            self.wfile.write(data.encode('utf-8'))
+            self.wfile.flush()
+        except OSError:
+            return False
+        return True
+
+
+class ThreadingServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Faults:
+    """Fault injection settings.
+
+    Arguments:
+        latency (float): maximum extra delay in seconds before each reply
+        drop_rate (float): probability of dropping a connection mid-reply
+        seed (int): seed for the fault random generator
+    """
+
+    def __init__(self, latency=0.0, drop_rate=0.0, seed=0):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+
+
+class FakeMPDServer:
+    """MPD stand-in listening on host:port.
+    port 0 picks a free port, which is kept across restarts.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, catalog=None, faults=None):
+        self.host = host
+        self.port = port
+        self.catalog = catalog or Catalog()
+        self.faults = faults or Faults()
+        self.player = PlayerState()
+        self.stats = Counter()
+        # Well formed commands the stand-in does not implement, by name
+        self.unknown_commands = Counter()
+        self.stats_lock = threading.Lock()
+        self.connections = set()
+        self.server = None
+        self.thread = None
+
+    def count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def register(self, sock):
+        self.count('connections')
+        with self.stats_lock:
+            self.connections.add(sock)
+
+    def unregister(self, sock):
+        with self.stats_lock:
+            self.connections.discard(sock)
+
+    def start(self):
+        self.server = ThreadingServer((self.host, self.port),
+                                      MPDRequestHandler)
+        self.server.owner = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        with self.stats_lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server = None
+
+    def restart(self, downtime=1.0):
+        """Drop every client, stay down for downtime seconds, come back."""
+        self.stop()
+        self.count('restarts')
+        time.sleep(downtime)
+        self.start()
+
+    def snapshot(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def unknown_snapshot(self):
+        with self.stats_lock:
+            return dict(self.unknown_commands)
+
+    ######################################################################
+    # Command handling
+
+    def execute(self, line):
+        try:
+            args = shlex.split(line)
+        except ValueError:
+            # Unbalanced quoting: two commands written over each other
+            self.count('malformed')
+            raise CommandError(ACK_ERROR_ARG, '', 'malformed command')
+        if not args:
+            self.count('malformed')
+            raise CommandError(ACK_ERROR_UNKNOWN, '', 'No command given')
+        name, args = args[0], args[1:]
+        handler = getattr(self, 'cmd_' + name, None)
+        if handler is None:
+            with self.stats_lock:
+                self.unknown_commands[name] += 1
+            raise CommandError(ACK_ERROR_UNKNOWN, name,
+                               'unknown command "{}"'.format(name))
+        with self.player.lock:
+            return handler(name, *args)
+
+    @staticmethod
+    def format_song(song):
+        return ''.join('{}: {}\n'.format(k, v) for k, v in song.items())
+
+    def cmd_ping(self, name):
+        return ''
+
+    def cmd_status(self, name):
+        player = self.player
+        lines = ['volume: 80', 'repeat: 0', 'random: 0', 'single: 0',
+                 'consume: 0', 'playlist: {}'.format(player.version),
+                 'playlistlength: {}'.format(len(player.queue)),
+                 'state: {}'.format(player.state)]
+        if player.queue and player.state != 'stop':
+            lines.append('song: {}'.format(player.position))
+        return '\n'.join(lines) + '\n'
+
+    def cmd_currentsong(self, name):
+        song = self.player.current()
+        return self.format_song(song) if song else ''
+
+    def cmd_play(self, name, position=None):
+        player = self.player
+        if not player.queue:
+            player.state = 'stop'
+            return ''
+        if position is not None:
+            player.position = int(position) % len(player.queue)
+        player.state = 'play'
+        return ''
+
+    def cmd_pause(self, name, flag=None):
+        player = self.player
+        if player.state == 'stop':
+            return ''
+        if flag is None:
+            paused = player.state != 'pause'
+        else:
+            paused = flag == '1'
+        player.state = 'pause' if paused else 'play'
+        return ''
+
+    def cmd_stop(self, name):
+        self.player.state = 'stop'
+        return ''
+
+    def cmd_next(self, name):
+        player = self.player
+        if player.queue and player.state != 'stop':
+            player.position = (player.position + 1) % len(player.queue)
+        return ''
+
+    def cmd_previous(self, name):
+        player = self.player
+        if player.queue and player.state != 'stop':
+            player.position = (player.position - 1) % len(player.queue)
+        return ''
+
+    def cmd_clear(self, name):
+        player = self.player
+        player.queue = []
+        player.position = 0
+        player.state = 'stop'
+        player.version += 1
+        return ''
+
+    def cmd_shuffle(self, name, *args):
+        self.faults.rng.shuffle(self.player.queue)
+        self.player.version += 1
+        return ''
+
+    def cmd_load(self, name, playlist):
+        if playlist not in self.catalog.playlists:
+            raise CommandError(ACK_ERROR_NO_EXIST, name, 'No such playlist')
+        self.player.queue.extend(self.catalog.playlists[playlist])
+        self.player.version += 1
+        return ''
+
+    def cmd_list(self, name, tag, *args):
+        key = tag.capitalize()
+        return ''.join('{}: {}\n'.format(key, v)
+                       for v in self.catalog.tag_values(tag))
+
+    def cmd_listplaylists(self, name):
+        return ''.join('playlist: {}\nLast-Modified: 2020-01-01T00:00:00Z\n'
+                       .format(p) for p in self.catalog.playlists)
+
+    def cmd_listplaylistinfo(self, name, playlist):
+        if playlist not in self.catalog.playlists:
+            raise CommandError(ACK_ERROR_NO_EXIST, name, 'No such playlist')
+        return ''.join(self.format_song(s)
+                       for s in self.catalog.playlists[playlist])
+
+    def cmd_search(self, name, tag, value, *args):
+        return ''.join(self.format_song(s)
+                       for s in self.catalog.search(tag, value))
+
+    def cmd_searchadd(self, name, tag, value, *args):
+        self.player.queue.extend(self.catalog.search(tag, value))
+        self.player.version += 1
+        return ''
+
+    def cmd_albumart(self, name, uri, offset='0'):
+        raise CommandError(ACK_ERROR_NO_EXIST, name, 'No file exists')
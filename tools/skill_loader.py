@@ -0,0 +1,24 @@
+"""
+    Import helper shared by the soak harness and the unit tests.
+    The skill lives in the repository root's __init__.py, whose directory
+    name is not an importable package name.
+"""
+import importlib.util
+import sys
+from os.path import abspath, dirname, join
+
+SKILL_DIR = dirname(dirname(abspath(__file__)))
+MODULE_NAME = 'mpc_player_skill'
+
+
+def load_skill():
+    """Import the skill package from the repository root, once."""
+    if MODULE_NAME in sys.modules:
+        return sys.modules[MODULE_NAME]
+    spec = importlib.util.spec_from_file_location(
+        MODULE_NAME, join(SKILL_DIR, '__init__.py'),
+        submodule_search_locations=[SKILL_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module